@@ -1,15 +1,35 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_compress import Compress
 from datetime import datetime, timedelta
+from functools import lru_cache
 import os
 import json
 import requests
+from sqlalchemy import bindparam, delete, event, insert
+from sqlalchemy.orm import load_only
 from sqlalchemy.types import TypeDecorator, VARCHAR
 import logging
 import random
+import threading
+from cachetools import TTLCache
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib json module
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # fall back to the stdlib random module
+    np = None
 
 # Initialize Flask application
 app = Flask(__name__)
+# Responses are built with ojson; keep Flask's own JSON provider compact and
+# unsorted for anything that still goes through it (e.g. error handlers)
+app.json.sort_keys = False
+app.json.compact = True
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -23,6 +43,28 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 # Initialize SQLAlchemy
 db = SQLAlchemy(app)
 
+# Compress text responses (index page and JSON), preferring brotli
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
+
+
+# Service badge emoji, in precedence order (first matching keyword wins)
+SERVICE_EMOJI = {
+    'withdraw': '💳',
+    'balance': '💰',
+    'cardless': '📲',
+    'deposit': '💵'
+}
+
+
+# Badge label for a service, e.g. "💵 Cash Deposit"
+@lru_cache(maxsize=256)
+def service_display(service):
+    lowered = service.lower()
+    emoji = next((e for keyword, e in SERVICE_EMOJI.items() if keyword in lowered), '🏧')
+    return f"{emoji} {service}"
+
 
 # Custom JSON type for SQLAlchemy
 class JSONField(TypeDecorator):
@@ -30,11 +72,16 @@ class JSONField(TypeDecorator):
 
     def process_bind_param(self, value, dialect):
         if value is not None:
+            if orjson is not None:
+                # VARCHAR expects str, orjson produces bytes
+                return orjson.dumps(value).decode('utf-8')
             return json.dumps(value)
         return None
 
     def process_result_value(self, value, dialect):
         if value is not None:
+            if orjson is not None:
+                return orjson.loads(value)
             return json.loads(value)
         return None
 
@@ -49,6 +96,9 @@ class ATM(db.Model):
     services = db.Column(JSONField, nullable=False)
     fetched_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Composite index for bounding-box lookups
+    __table_args__ = (db.Index('ix_atm_latlng', 'lat', 'lng'),)
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -57,17 +107,72 @@ class ATM(db.Model):
             'lng': self.lng,
             'address': self.address,
             'services': self.services,
-            'fetched_at': self.fetched_at.isoformat() if self.fetched_at else None
+            'services_display': [service_display(service) for service in self.services],
+            'fetched_at': self.fetched_at
         }
 
+    def to_summary_dict(self):
+        # Map listing fields only; services are fetched per ATM on demand
+        return {
+            'id': self.id,
+            'name': self.name,
+            'lat': self.lat,
+            'lng': self.lng,
+            'address': self.address,
+            'fetched_at': self.fetched_at
+        }
+
+
+# Tune SQLite on every new connection: WAL lets readers proceed during the
+# refresh write, and synchronous=NORMAL is safe under WAL
+def set_sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=134217728")
+    cursor.close()
+
 
 # Create database tables
 with app.app_context():
+    # Register before create_all so the first pooled connection is tuned too
+    event.listen(db.engine, "connect", set_sqlite_pragmas)
     db.create_all()
+    # create_all skips existing tables, so add any missing indexes explicitly
+    for index in ATM.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
 
 # Default radius in meters
 DEFAULT_RADIUS = 1000
 
+# Encoded /api/atms responses keyed by rounded (lat, lng, radius)
+atm_list_cache = TTLCache(maxsize=256, ttl=60)
+atm_list_cache_lock = threading.Lock()
+
+# Encoded /api/atms/<id> responses, kept for the 15 minute freshness window
+atm_detail_cache = TTLCache(maxsize=1024, ttl=15 * 60)
+atm_detail_cache_lock = threading.Lock()
+
+# Bank names for more realistic mock data
+BANK_NAMES = (
+    "United Bank", "Citizens Financial", "First National", "Metro Credit Union",
+    "Community Bank", "Urban Trust", "Heritage Bank", "Liberty Financial",
+    "Capital One", "Chase", "Wells Fargo", "Bank of America"
+)
+
+# Street names for mock address generation
+STREET_NAMES = (
+    "Main St", "Oak Ave", "Maple Rd", "Broadway", "Park Ave",
+    "Washington St", "Market St", "State St", "Water St", "Commerce Way"
+)
+
+# Available ATM services
+ALL_SERVICES = (
+    "Cash Withdrawal", "Cash Deposit", "Cardless Withdrawal",
+    "Balance Inquiry", "Check Deposit", "Bill Payment"
+)
+
 # HTML template for the main page - using Leaflet instead of Google Maps
 MAIN_TEMPLATE = '''
 <!DOCTYPE html>
@@ -77,10 +182,9 @@ MAIN_TEMPLATE = '''
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>ATM Booth Finder</title>
 
-    <!-- Leaflet CSS -->
-    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" 
-          integrity="sha256-p4NxAoJBhIIN+hmNHrzRCf9tD/miZyoHS5obTRR9BMY=" 
-          crossorigin=""/>
+    <!-- Leaflet CSS (vendored) -->
+    <link rel="stylesheet" href="/static/vendor/leaflet-1.9.4/leaflet.css"
+          integrity="sha256-p4NxAoJBhIIN+hmNHrzRCf9tD/miZyoHS5obTRR9BMY="/>
 
     <style>
         :root {
@@ -341,10 +445,9 @@ MAIN_TEMPLATE = '''
         </div>
     </div>
 
-    <!-- Leaflet JS -->
-    <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js" 
-            integrity="sha256-20nQCchB9co0qIjJZRGuk2/Z9VM+kNiyxNV1lvTlZBo=" 
-            crossorigin=""></script>
+    <!-- Leaflet JS (vendored) -->
+    <script src="/static/vendor/leaflet-1.9.4/leaflet.js"
+            integrity="sha256-20nQCchB9co0qIjJZRGuk2/Z9VM+kNiyxNV1lvTlZBo="></script>
 
     <script>
         // Global variables
@@ -494,7 +597,7 @@ MAIN_TEMPLATE = '''
             // Create ATM icon
             const atmIcon = L.icon({
                 iconUrl: 'https://cdn.rawgit.com/pointhi/leaflet-color-markers/master/img/marker-icon-2x-green.png',
-                shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.3.4/images/marker-shadow.png',
+                shadowUrl: '/static/vendor/leaflet-1.9.4/images/marker-shadow.png',
                 iconSize: [25, 41],
                 iconAnchor: [12, 41],
                 popupAnchor: [1, -34],
@@ -550,19 +653,12 @@ MAIN_TEMPLATE = '''
             const servicesContainer = document.getElementById('services-container');
             servicesContainer.innerHTML = '';
 
-            if (atm.services && atm.services.length > 0) {
-                atm.services.forEach(service => {
+            if (atm.services_display && atm.services_display.length > 0) {
+                // Labels already include the service emoji from the server
+                atm.services_display.forEach(label => {
                     const serviceElement = document.createElement('span');
                     serviceElement.className = 'service-badge';
-
-                    // Add appropriate emoji based on service type
-                    let emoji = '🏧';
-                    if (service.toLowerCase().includes('deposit')) emoji = '💵';
-                    if (service.toLowerCase().includes('cardless')) emoji = '📲';
-                    if (service.toLowerCase().includes('balance')) emoji = '💰';
-                    if (service.toLowerCase().includes('withdraw')) emoji = '💳';
-
-                    serviceElement.textContent = `${emoji} ${service}`;
+                    serviceElement.textContent = label;
                     servicesContainer.appendChild(serviceElement);
                 });
             } else {
@@ -615,6 +711,37 @@ MAIN_TEMPLATE = '''
 </html>
 '''
 
+# The main template has no Jinja expressions, so it is served as-is
+INDEX_HTML = MAIN_TEMPLATE
+
+
+# Cosine of a latitude rounded to 2 decimals (~1 km), so nearby requests share
+# cache entries. The relative error grows with tan(lat): under 1% up to about
+# 89.5°, and larger closer to the poles
+@lru_cache(maxsize=1024)
+def _cos_lat(lat_r2):
+    return math.cos(math.radians(lat_r2))
+
+
+# Function to convert a radius in meters to degrees around a location
+def radius_to_degrees(lat, radius):
+    """
+    Convert a radius in meters to latitude/longitude deltas (very approximate)
+
+    Args:
+        lat (float): Center latitude
+        radius (int): Radius in meters
+
+    Returns:
+        tuple: (radius_lat, radius_lng) in degrees
+    """
+    # 1 degree of latitude is approximately 111,000 meters
+    radius_lat = radius / 111000
+    # 1 degree of longitude varies with latitude; clamp the rounded latitude so
+    # it never reaches 90, where the cosine is ~0 and radius_lng blows up
+    radius_lng = radius / (111000 * _cos_lat(min(abs(round(lat, 2)), 89.99)))
+    return radius_lat, radius_lng
+
 
 # Function to generate mock ATMs around a location
 def generate_mock_atms(lat, lng, radius, count=10):
@@ -630,68 +757,87 @@ def generate_mock_atms(lat, lng, radius, count=10):
     Returns:
         list: List of ATM dictionaries
     """
-    atms = []
-
-    # Convert radius from meters to degrees (very approximate)
-    # 1 degree of latitude is approximately 111,000 meters
-    radius_lat = radius / 111000
-    # 1 degree of longitude varies with latitude
-    radius_lng = radius / (111000 * abs(math.cos(math.radians(lat))))
-
-    # Bank names for more realistic data
-    bank_names = [
-        "United Bank", "Citizens Financial", "First National", "Metro Credit Union",
-        "Community Bank", "Urban Trust", "Heritage Bank", "Liberty Financial",
-        "Capital One", "Chase", "Wells Fargo", "Bank of America"
+    # Convert radius from meters to degrees
+    radius_lat, radius_lng = radius_to_degrees(lat, radius)
+
+    # Draw each field for all ATMs at once
+    banks = random.choices(BANK_NAMES, k=count)
+    streets = random.choices(STREET_NAMES, k=count)
+    street_numbers = [random.randint(1, 999) for _ in range(count)]
+    # Random services (2-4 services per ATM)
+    services = [random.sample(ALL_SERVICES, random.randint(2, 4)) for _ in range(count)]
+
+    # Random positions within radius
+    if np is not None:
+        rng = np.random.default_rng()
+        lats = (lat + rng.uniform(-1, 1, count) * radius_lat).tolist()
+        lngs = (lng + rng.uniform(-1, 1, count) * radius_lng).tolist()
+    else:
+        lats = [lat + (random.random() * 2 - 1) * radius_lat for _ in range(count)]
+        lngs = [lng + (random.random() * 2 - 1) * radius_lng for _ in range(count)]
+
+    atms = [
+        {
+            'name': f"{bank} ATM",
+            'lat': atm_lat,
+            'lng': atm_lng,
+            'address': f"{street_number} {street}",
+            'services': atm_services
+        }
+        for bank, street, street_number, atm_services, atm_lat, atm_lng
+        in zip(banks, streets, street_numbers, services, lats, lngs)
     ]
 
-    # Street names for address generation
-    street_names = [
-        "Main St", "Oak Ave", "Maple Rd", "Broadway", "Park Ave",
-        "Washington St", "Market St", "State St", "Water St", "Commerce Way"
-    ]
+    return atms
 
-    # Available services
-    all_services = [
-        "Cash Withdrawal", "Cash Deposit", "Cardless Withdrawal",
-        "Balance Inquiry", "Check Deposit", "Bill Payment"
-    ]
 
-    # Generate random ATMs
-    for i in range(count):
-        # Random position within radius
-        random_lat = lat + (random.random() * 2 - 1) * radius_lat
-        random_lng = lng + (random.random() * 2 - 1) * radius_lng
+# Helper to encode a payload as JSON bytes
+def dump_json(data):
+    """
+    Encode a payload as JSON with orjson
 
-        # Random bank name
-        bank = random.choice(bank_names)
+    Naive datetimes are stored as UTC, so they are serialized with a UTC offset.
 
-        # Random address
-        street_number = random.randint(1, 999)
-        street = random.choice(street_names)
-        address = f"{street_number} {street}"
+    Args:
+        data: JSON-serializable payload
 
-        # Random services (2-4 services per ATM)
-        service_count = random.randint(2, 4)
-        services = random.sample(all_services, service_count)
+    Returns:
+        bytes: Encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NAIVE_UTC)
+    return json.dumps(data, default=lambda o: o.isoformat() + '+00:00').encode('utf-8')
 
-        atm = {
-            'name': f"{bank} ATM",
-            'lat': random_lat,
-            'lng': random_lng,
-            'address': address,
-            'services': services
-        }
-        atms.append(atm)
 
-    return atms
+# Helper to build JSON responses with orjson
+def ojson(data, status=200):
+    """
+    Build a JSON response with orjson
+
+    Args:
+        data: JSON-serializable payload, or bytes already encoded by dump_json
+        status (int): HTTP status code
+
+    Returns:
+        Response: application/json response
+    """
+    body = data if isinstance(data, bytes) else dump_json(data)
+    return Response(body, status=status, mimetype='application/json')
+
+
+# Vendored static assets carry their version in the path, so browsers can cache them for good
+@app.after_request
+def add_static_cache_headers(response):
+    if request.path.startswith('/static/vendor/'):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 
 # Routes
 @app.route('/')
 def index():
     """Render the main page with the map"""
-    return render_template_string(MAIN_TEMPLATE)
+    return Response(INDEX_HTML, mimetype='text/html')
 
 
 @app.route('/api/atms')
@@ -713,9 +859,24 @@ def get_atms():
         lng = float(request.args.get('lng', 0))
         radius = int(request.args.get('radius', DEFAULT_RADIUS))
 
-        # Check if we have fresh data
-        fifteen_mins_ago = datetime.utcnow() - timedelta(minutes=15)
-        fresh_atms = ATM.query.filter(ATM.fetched_at >= fifteen_mins_ago).all()
+        # Serve repeat requests for the same area straight from the response cache
+        cache_key = (round(lat, 3), round(lng, 3), radius)
+        with atm_list_cache_lock:
+            cached_body = atm_list_cache.get(cache_key)
+        if cached_body is not None:
+            return ojson(cached_body)
+
+        # Check if we have fresh data within the search bounding box
+        now = datetime.utcnow()
+        fifteen_mins_ago = now - timedelta(minutes=15)
+        radius_lat, radius_lng = radius_to_degrees(lat, radius)
+        fresh_atms = ATM.query.options(
+            load_only(ATM.id, ATM.name, ATM.lat, ATM.lng, ATM.address, ATM.fetched_at)
+        ).filter(
+            ATM.fetched_at >= fifteen_mins_ago,
+            ATM.lat.between(lat - radius_lat, lat + radius_lat),
+            ATM.lng.between(lng - radius_lng, lng + radius_lng)
+        ).all()
 
         # If data is stale or we have no data, generate mock data
         # In a real app, this would fetch from an external API
@@ -725,41 +886,81 @@ def get_atms():
             # Generate mock ATM data
             num_atms = random.randint(5, 15)  # Random number of ATMs between 5 and 15
             atm_data = generate_mock_atms(lat, lng, radius, count=num_atms)
+            atm_list = []
 
             # Clear old data if we have new data
             if atm_data:
-                # Delete all existing ATMs - in a production app, you might want a more nuanced approach
-                ATM.query.delete()
+                # Delete only stale ATMs; fresh ones for other areas are kept
+                db.session.execute(delete(ATM).where(ATM.fetched_at < fifteen_mins_ago))
+
+                # Encode all services lists up front so the insert can bind them
+                # as plain strings instead of going through JSONField per row
+                if orjson is not None:
+                    services_json = [orjson.dumps(atm['services']).decode('utf-8') for atm in atm_data]
+                else:
+                    services_json = [json.dumps(atm['services']) for atm in atm_data]
+
+                # Add new ATMs to the database in a single bulk insert
+                rows = [
+                    {
+                        'name': atm['name'],
+                        'lat': atm['lat'],
+                        'lng': atm['lng'],
+                        'address': atm['address'],
+                        'services': atm_services_json,
+                        'fetched_at': now
+                    }
+                    for atm, atm_services_json in zip(atm_data, services_json)
+                ]
+                # Without sort_by_parameter_order SQLAlchemy renders one multi-row
+                # INSERT ... VALUES (...), (...) RETURNING id; SQLite hands out
+                # ascending rowids in VALUES order, so sorting restores row order
+                stmt = (
+                    insert(ATM.__table__)
+                    .values(services=bindparam('services', type_=VARCHAR))
+                    .returning(ATM.__table__.c.id)
+                )
+                ids = sorted(db.session.execute(stmt, rows).scalars().all())
                 db.session.commit()
 
-                # Add new ATMs to the database
-                for atm in atm_data:
-                    new_atm = ATM(
-                        name=atm['name'],
-                        lat=atm['lat'],
-                        lng=atm['lng'],
-                        address=atm['address'],
-                        services=atm['services'],
-                        fetched_at=datetime.utcnow()
-                    )
-                    db.session.add(new_atm)
+                # Stale rows were deleted and their ids may be reused, so drop
+                # any list and detail bodies that still reference them
+                with atm_list_cache_lock:
+                    atm_list_cache.clear()
+                with atm_detail_cache_lock:
+                    atm_detail_cache.clear()
 
-                db.session.commit()
+                for row, atm_id in zip(rows, ids):
+                    row['id'] = atm_id
 
-            # Get the newly added ATMs
-            atms = ATM.query.all()
+                # Build the response from the rows we just inserted rather than
+                # reading them back from the database
+                atm_list = [
+                    {
+                        'id': row['id'],
+                        'name': row['name'],
+                        'lat': row['lat'],
+                        'lng': row['lng'],
+                        'address': row['address'],
+                        'fetched_at': now
+                    }
+                    for row in rows
+                ]
         else:
             logger.info("Using cached ATM data")
-            atms = fresh_atms
 
-        # Convert ATMs to dictionary format
-        atm_list = [atm.to_dict() for atm in atms]
+            # Convert ATMs to dictionary format
+            atm_list = [atm.to_summary_dict() for atm in fresh_atms]
+
+        body = dump_json({"atms": atm_list})
+        with atm_list_cache_lock:
+            atm_list_cache[cache_key] = body
 
-        return jsonify({"atms": atm_list})
+        return ojson(body)
 
     except Exception as e:
         logger.error(f"Error in get_atms: {e}")
-        return jsonify({"error": str(e)}), 500
+        return ojson({"error": str(e)}, 500)
 
 
 @app.route('/api/atms/<int:atm_id>')
@@ -774,15 +975,24 @@ def get_atm(atm_id):
         json: Detailed ATM data
     """
     try:
-        atm = ATM.query.get(atm_id)
+        with atm_detail_cache_lock:
+            cached_body = atm_detail_cache.get(atm_id)
+        if cached_body is not None:
+            return ojson(cached_body)
+
+        atm = db.session.get(ATM, atm_id)
         if not atm:
-            return jsonify({"error": "ATM not found"}), 404
+            return ojson({"error": "ATM not found"}, 404)
+
+        body = dump_json(atm.to_dict())
+        with atm_detail_cache_lock:
+            atm_detail_cache[atm_id] = body
 
-        return jsonify(atm.to_dict())
+        return ojson(body)
 
     except Exception as e:
         logger.error(f"Error in get_atm: {e}")
-        return jsonify({"error": str(e)}), 500
+        return ojson({"error": str(e)}, 500)
 
 
 # Import math module for coordinate calculations